@@ -1,35 +1,235 @@
+"""
+Mixture of Gaussians target distributions.
+
+The factories below ('MixtureGaussian', 'MixNormal*', 'MixMultiNormal*') build
+'tfp.distributions' objects eagerly, which is convenient for debugging and
+inspection. For production sampling and density evaluation, pass the resulting
+distributions to 'sample_mixture' and 'log_prob_mixture', which run the
+computation as an XLA-compiled 'tf.function'. With the pinned
+tensorflow-probability version, distributions are not guaranteed to be
+composite tensors: each new distribution object is then a new Python argument
+and triggers a retrace and recompile, as does each new sample size (or input
+shape). Reuse the same object across calls, e.g. the cached 'MixtureGaussian'.
+'make_mixture_gaussian_log_prob_3' builds an XLA-compiled 'MixtureGaussian'
+log-density specialized to ncomp = 3, traced once per '(ndims, seed)'.
+Consumers that only need samples from a diagonal mixture (and not its
+log-density) can bypass TFP entirely with 'fast_sample_mix_multi_normal_diag'.
+"""
 import os
-import sklearn # type: ignore
+import functools
 import numpy as np
-import pandas as pd # type: ignore
-from matplotlib import pyplot as plt # type: ignore
 import tensorflow as tf
 import tensorflow_probability as tfp
 import numpy as np
 import random
 from typing import List, Tuple, Dict, Callable, Union, Optional
 
+@functools.lru_cache(maxsize=32)
 def MixtureGaussian(ncomp: int,
                     ndims: int,
-                    seed: int = 0) -> tfp.distributions.Mixture:
+                    seed: int = 0,
+                    dtype: str = 'float32',
+                    validate: bool = False) -> tfp.distributions.MixtureSameFamily:
     """
     Correlated mixture of Gaussians used in https://arxiv.org/abs/2302.12024 
-    with ncomp = 3 and ndims varying from 4 to 1000
+    with ncomp = 3 and ndims varying from 4 to 1000.
+    Distributions are cached by '(ncomp, ndims, seed, dtype, validate)', so repeated calls return the same object.
+    The distribution is always built eagerly (under 'tf.init_scope'), so that a first call made while
+    a 'tf.function' is tracing does not cache tensors bound to that function's graph.
     
     Args:
         ncomp: int, number of components
         ndims: int, number of dimensions
         seed: int, random seed
+        dtype: str, dtype of the parameters ('float32' or 'float64')
+        validate: bool, if True TFP validates the distribution arguments (for debugging)
 
     Returns:
-        targ_dist: tfp.distributions.Mixture, mixture of Gaussians
+        targ_dist: tfp.distributions.MixtureSameFamily, mixture of Gaussians
     """
-    targ_dist: tfp.distributions.Mixture = MixMultiNormal1(ncomp, ndims, seed = seed)
+    with tf.init_scope():
+        targ_dist: tfp.distributions.MixtureSameFamily = MixMultiNormal1(ncomp, ndims, seed = seed, dtype = dtype, validate = validate)
     return targ_dist
 
+@functools.lru_cache(maxsize=32)
+def make_mixture_gaussian_log_prob_3(ndims: int,
+                                     seed: int = 0) -> Callable[[tf.Tensor], tf.Tensor]:
+    """
+    Builds the log-density of 'MixtureGaussian(3, ndims, seed)' specialized to the
+    fixed number of components (ncomp = 3) used in https://arxiv.org/abs/2302.12024.
+    The parameters are read from the (cached) 'MixtureGaussian' distribution, so the two
+    always agree, and are evaluated eagerly (under 'tf.init_scope') so that the cached function
+    never closes over tensors of a 'tf.function' graph that was tracing during the first call. The returned function has a fixed float32 '(None,ndims)' input signature
+    and is compiled with XLA, which fuses the log-densities of the three components into a
+    single kernel.
+    
+    Args:
+        ndims: int, number of dimensions
+        seed: int, random seed
+
+    Returns:
+        mixture_gaussian_log_prob_3: Callable, function mapping a float32 tensor with shape
+            '(n_samples,ndims)' to the log-density with shape '(n_samples,)'
+    """
+    targ_dist: tfp.distributions.MixtureSameFamily = MixtureGaussian(3, ndims, seed = seed, dtype = 'float32')
+    loc: tf.Tensor
+    scale: tf.Tensor
+    log_probs: tf.Tensor
+    with tf.init_scope():
+        loc = tf.convert_to_tensor(targ_dist.components_distribution.loc)
+        scale = targ_dist.components_distribution.stddev()
+        log_probs = tf.nn.log_softmax(targ_dist.mixture_distribution.logits_parameter())
+
+    @tf.function(jit_compile=True,
+                 input_signature=[tf.TensorSpec(shape=[None, ndims], dtype=tf.float32)])
+    def mixture_gaussian_log_prob_3(x: tf.Tensor) -> tf.Tensor:
+        logp_components: tf.Tensor = tf.reduce_sum(
+            tfp.distributions.Normal(loc = loc, scale = scale).log_prob(x[:, None, :]), axis=-1)
+        return tf.reduce_logsumexp(logp_components + log_probs, axis=-1)
+
+    return mixture_gaussian_log_prob_3
+
+@tf.function(jit_compile=True)
+def _sample_mixture(dist: tfp.distributions.Distribution,
+                    n: int,
+                    seed: Optional[tf.Tensor]) -> tf.Tensor:
+    return dist.sample(n, seed = seed)
+
+def sample_mixture(dist: tfp.distributions.Distribution,
+                   n: int,
+                   seed: Optional[Union[int, tf.Tensor]] = None) -> tf.Tensor:
+    """
+    Draws 'n' samples from the distribution 'dist' in XLA-compiled graph mode.
+    Since 'n' fixes the output shape, each new value of 'n' retraces and recompiles the function,
+    and so may each new distribution object (see the module docstring): reuse the same 'n' and
+    the same 'dist' (e.g. the cached 'MixtureGaussian') in sampling loops.
+    An integer 'seed' is converted to the stateless seed 'tf.constant([seed, 0])' before the
+    compiled call, so that repeated calls with the same seed give the same samples and new seed
+    values do not trigger a retrace. With 'seed=None' the draws are not reproducible.
+
+    Args:
+        dist: tfp.distributions.Distribution, distribution to sample from
+        n: int, number of samples
+        seed: int or shape '(2,)' int32 tf.Tensor (stateless seed), optional seed making the draws reproducible
+
+    Returns:
+        tf.Tensor, samples with shape (n,) + event shape of 'dist'
+    """
+    if isinstance(seed, int):
+        seed = tf.constant([seed, 0], dtype = tf.int32)
+    return _sample_mixture(dist, n, seed)
+
+@tf.function(jit_compile=True)
+def log_prob_mixture(dist: tfp.distributions.Distribution,
+                     x: tf.Tensor) -> tf.Tensor:
+    """
+    Evaluates the log-density of the distribution 'dist' on 'x' in XLA-compiled graph mode.
+    Each new input shape, and possibly each new distribution object (see the module docstring),
+    retraces and recompiles the function: reuse the same 'dist' (e.g. the cached 'MixtureGaussian').
+
+    Args:
+        dist: tfp.distributions.Distribution, distribution to evaluate
+        x: tf.Tensor, points where the log-density is evaluated
+
+    Returns:
+        tf.Tensor, log-density of 'dist' at 'x'
+    """
+    return dist.log_prob(x)
+
+def fast_sample_mix_multi_normal_diag(n: int,
+                                      loc: np.ndarray,
+                                      scale: np.ndarray,
+                                      probs: np.ndarray,
+                                      rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    Draws 'n' samples from a mixture of Multivariate Normal distributions with diagonal covariance
+    (the distribution built by 'MixMultiNormal1') using only 'numpy'.
+    This is a fast path for Monte Carlo consumers that only need samples and not the log-density.
+    The parameters of a distribution 'dist' returned by 'MixMultiNormal1' (or 'MixtureGaussian')
+    can be obtained as
+
+    .. code-block:: python
+
+        loc = dist.components_distribution.loc.numpy()
+        scale = dist.components_distribution.stddev().numpy()
+        probs = tf.nn.softmax(dist.mixture_distribution.logits).numpy()
+
+    The samples have the floating point dtype of 'loc' and 'scale' (float32 or float64; integer
+    and lower precision inputs are promoted).
+    
+    Args:
+        n: int, number of samples
+        loc: np.ndarray, means with shape '(n_components,n_dimensions)'
+        scale: np.ndarray, stddevs with shape '(n_components,n_dimensions)'
+        probs: np.ndarray, (unnormalized) mixture probabilities with shape '(n_components,)'
+        rng: np.random.Generator, random number generator (a fresh 'np.random.default_rng()' if None)
+
+    Returns:
+        np.ndarray, samples with shape '(n,n_dimensions)'
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    loc = np.asarray(loc)
+    scale = np.asarray(scale)
+    probs = np.asarray(probs, dtype=np.float64)
+    if len(probs) != loc.shape[0] or loc.shape[0] != scale.shape[0]:
+        raise Exception('probs, loc and scale must have the same number of components.')
+    dtype: np.dtype = np.result_type(loc, scale, np.float32)
+    if dtype not in (np.float32, np.float64):
+        dtype = np.dtype(np.float64)
+    k: np.ndarray = rng.choice(len(probs), size=n, p=probs/probs.sum())
+    z: np.ndarray = rng.standard_normal((n, loc.shape[1]), dtype=dtype)
+    return (loc[k] + scale[k] * z).astype(dtype, copy=False)
+
+def _sample_params(n_components: int,
+                   n_dimensions: int,
+                   seed: int = 0,
+                   per_dimension_probs: bool = False,
+                   dtype: str = 'float32') -> Tuple[tf.Tensor, tf.Tensor, tf.Tensor]:
+    """
+    Draws the parameters of a mixture of Gaussians from a single seeded 'np.random.Generator'.
+    The parameters are drawn directly in 'dtype', avoiding a float64 to float32 downcast copy.
+    They never change, so they are returned as constant tensors, copied once onto the current
+    default device with 'tf.identity' so that using the distribution does not copy them from the
+    host on every call. No 'tf.Variable' is created, so the uncached factories can be called inside
+    a 'tf.function'; in that case the tensors belong to the traced graph and must not outlive it
+    (the cached 'MixtureGaussian' builds its parameters under 'tf.init_scope' for this reason).
+
+    Args:
+        n_components: int, number of components
+        n_dimensions: int, number of dimensions
+        seed: int, random seed
+        per_dimension_probs: bool, if True 'logits' has shape '(n_dimensions,n_components)',
+            otherwise '(n_components,)'
+        dtype: str, dtype of the parameters ('float32' or 'float64')
+
+    Returns:
+        loc: tf.Tensor, means with shape '(n_components,n_dimensions)'
+        scale: tf.Tensor, stddevs with shape '(n_components,n_dimensions)'
+        logits: tf.Tensor, log of the normalized mixture probabilities
+    """
+    np_dtype: np.dtype = np.dtype(dtype)
+    rng: np.random.Generator = np.random.default_rng(seed)
+    loc: np.ndarray = rng.random((n_components, n_dimensions), dtype = np_dtype) * np_dtype.type(10.)
+    # Draw from (0, 1] rather than [0, 1): in float32 an exact 0.0 has probability 2^-24 per entry
+    # and would give a degenerate Normal component.
+    scale: np.ndarray = np_dtype.type(1.) - rng.random((n_components, n_dimensions), dtype = np_dtype)
+    probs: np.ndarray
+    if per_dimension_probs:
+        probs = rng.random((n_dimensions, n_components), dtype = np_dtype)
+    else:
+        probs = rng.random(n_components, dtype = np_dtype)
+    probs = probs / probs.sum(axis = -1, keepdims = True)
+    logits: np.ndarray = np.log(probs)
+    return (tf.identity(tf.constant(loc, dtype = dtype)),
+            tf.identity(tf.constant(scale, dtype = dtype)),
+            tf.identity(tf.constant(logits, dtype = dtype)))
+
 def MixNormal1(n_components: int = 3,
                n_dimensions: int = 4,
-               seed: int = 0) -> tfp.distributions.Mixture:
+               seed: int = 0,
+               dtype: str = 'float32',
+               validate: bool = False) -> tfp.distributions.MixtureSameFamily:
     """
     Defines a mixture of 'n_components' Normal distributions in 'n_dimensions' dimensions 
     with means and stddevs given by the tensors 'loc' and 'scale' with shapes 
@@ -48,27 +248,28 @@ def MixNormal1(n_components: int = 3,
         n_components: int, number of components
         n_dimensions: int, number of dimensions
         seed: int, random seed
+        dtype: str, dtype of the parameters ('float32' or 'float64')
+        validate: bool, if True TFP validates the distribution arguments (for debugging)
         
     Returns:
-        mix_gauss: tfp.distributions.Mixture, mixture of Gaussians
-    """
-    reset_random_seeds(seed)
-    loc: np.ndarray = np.random.sample([n_components, n_dimensions]) * 10
-    scale: np.ndarray = np.random.sample([n_components,n_dimensions])
-    probs: np.ndarray = np.random.sample([n_dimensions,n_components])
-    components: List[tfp.distributions.Normal] = []
-    for i in range(n_components):
-        components.append(tfp.distributions.Normal(loc = loc[i],
-                                     scale = scale[i]))
-    mix_gauss: tfp.distributions.Mixture = tfp.distributions.Mixture(
-        cat = tfp.distributions.Categorical(probs=probs),
-        components = components,
-        validate_args = True)
+        mix_gauss: tfp.distributions.MixtureSameFamily, mixture of Gaussians
+    """
+    loc: tf.Tensor
+    scale: tf.Tensor
+    logits: tf.Tensor
+    loc, scale, logits = _sample_params(n_components, n_dimensions, seed, dtype = dtype, per_dimension_probs = True)
+    mix_gauss: tfp.distributions.MixtureSameFamily = tfp.distributions.MixtureSameFamily(
+        mixture_distribution = tfp.distributions.Categorical(logits = logits),
+        components_distribution = tfp.distributions.Normal(loc = tf.transpose(loc),
+                                                           scale = tf.transpose(scale)),
+        validate_args = validate)
     return mix_gauss
     
 def MixNormal2(n_components: int = 3,
                n_dimensions: int = 4,
-               seed: int = 0) -> tfp.distributions.Mixture:
+               seed: int = 0,
+               dtype: str = 'float32',
+               validate: bool = False) -> tfp.distributions.Mixture:
     """
     Defines a mixture of 'n_components' Normal distributions in 'n_dimensions' dimensions 
     with means and stddevs given by the tensors 'loc' and 'scale' with shapes 
@@ -87,24 +288,28 @@ def MixNormal2(n_components: int = 3,
         n_components: int, number of components
         n_dimensions: int, number of dimensions
         seed: int, random seed
+        dtype: str, dtype of the parameters ('float32' or 'float64')
+        validate: bool, if True TFP validates the distribution arguments (for debugging)
 
     Returns:    
         mix_gauss: tfp.distributions.MixtureSameFamily, mixture of Gaussians
     """
-    reset_random_seeds(seed)
-    loc: np.ndarray = np.random.sample([n_components, n_dimensions]) * 10
-    scale: np.ndarray = np.random.sample([n_components,n_dimensions])
-    probs: np.ndarray = np.random.sample(n_components)
+    loc: tf.Tensor
+    scale: tf.Tensor
+    logits: tf.Tensor
+    loc, scale, logits = _sample_params(n_components, n_dimensions, seed, dtype = dtype)
     mix_gauss: tfp.distributions.MixtureSameFamily = tfp.distributions.MixtureSameFamily(
-        mixture_distribution = tfp.distributions.Categorical(probs = probs),
+        mixture_distribution = tfp.distributions.Categorical(logits = logits),
         components_distribution = tfp.distributions.Normal(loc = loc,
                                              scale = scale),
-        validate_args = True)
+        validate_args = validate)
     return mix_gauss
 
 def MixNormal1_indep(n_components: int = 3,
                      n_dimensions: int = 4,
-                     seed: int = 0) -> tfp.distributions.Independent:
+                     seed: int = 0,
+                     dtype: str = 'float32',
+                     validate: bool = False) -> tfp.distributions.Independent:
     """
     Defines a mixture of 'n_components' Normal distributions in 'n_dimensions' dimensions 
     with means and stddevs given by the tensors 'loc' and 'scale' with shapes 
@@ -123,28 +328,29 @@ def MixNormal1_indep(n_components: int = 3,
         n_components: int, number of components
         n_dimensions: int, number of dimensions
         seed: int, random seed
+        dtype: str, dtype of the parameters ('float32' or 'float64')
+        validate: bool, if True TFP validates the distribution arguments (for debugging)
 
     Returns:
         mix_gauss: tfp.distributions.Independent, mixture of Gaussians
     """
-    reset_random_seeds(seed)
-    loc: np.ndarray = np.random.sample([n_components, n_dimensions]) * 10
-    scale: np.ndarray = np.random.sample([n_components,n_dimensions])
-    probs: np.ndarray = np.random.sample([n_dimensions,n_components])
-    components: List[tfp.distributions.Normal] = []
-    for i in range(n_components):
-        components.append(tfp.distributions.Normal(loc = loc[i], 
-                                     scale = scale[i]))
+    loc: tf.Tensor
+    scale: tf.Tensor
+    logits: tf.Tensor
+    loc, scale, logits = _sample_params(n_components, n_dimensions, seed, dtype = dtype, per_dimension_probs = True)
     mix_gauss: tfp.distributions.Independent = tfp.distributions.Independent(
-        distribution = tfp.distributions.Mixture(cat = tfp.distributions.Categorical(probs = probs),
-                                   components = components,
-                                   validate_args = True),
+        distribution = tfp.distributions.MixtureSameFamily(mixture_distribution = tfp.distributions.Categorical(logits = logits),
+                                             components_distribution = tfp.distributions.Normal(loc = tf.transpose(loc),
+                                                                                  scale = tf.transpose(scale)),
+                                             validate_args = validate),
         reinterpreted_batch_ndims = 0)
     return mix_gauss
     
 def MixNormal2_indep(n_components: int = 3,
                      n_dimensions: int = 4,  
-                     seed: int = 0) -> tfp.distributions.Independent:
+                     seed: int = 0,
+                     dtype: str = 'float32',
+                     validate: bool = False) -> tfp.distributions.Independent:
     """
     Defines a mixture of 'n_components' Normal distributions in 'n_dimensions' dimensions 
     with means and stddevs given by the tensors 'loc' and 'scale' with shapes 
@@ -163,25 +369,29 @@ def MixNormal2_indep(n_components: int = 3,
         n_components: int, number of components
         n_dimensions: int, number of dimensions
         seed: int, random seed
+        dtype: str, dtype of the parameters ('float32' or 'float64')
+        validate: bool, if True TFP validates the distribution arguments (for debugging)
         
     Returns:
         mix_gauss: tfp.distributions.Independent, mixture of Gaussians
     """
-    reset_random_seeds(seed)
-    loc: np.ndarray = np.random.sample([n_components, n_dimensions]) * 10
-    scale: np.ndarray = np.random.sample([n_components,n_dimensions])
-    probs: np.ndarray = np.random.sample(n_components)
+    loc: tf.Tensor
+    scale: tf.Tensor
+    logits: tf.Tensor
+    loc, scale, logits = _sample_params(n_components, n_dimensions, seed, dtype = dtype)
     mix_gauss: tfp.distributions.Independent = tfp.distributions.Independent(
-        distribution = tfp.distributions.MixtureSameFamily(mixture_distribution = tfp.distributions.Categorical(probs = probs),
+        distribution = tfp.distributions.MixtureSameFamily(mixture_distribution = tfp.distributions.Categorical(logits = logits),
                                              components_distribution = tfp.distributions.Normal(loc = loc,
                                                                                   scale = scale),
-                                             validate_args = True),
+                                             validate_args = validate),
         reinterpreted_batch_ndims = 0)
     return mix_gauss
 
 def MixMultiNormal1(n_components: int = 3,
                     n_dimensions: int = 4,
-                    seed: int = 0) -> tfp.distributions.Mixture:
+                    seed: int = 0,
+                    dtype: str = 'float32',
+                    validate: bool = False) -> tfp.distributions.MixtureSameFamily:
     """
     Defines a mixture of 'n_components' Multivariate Normal distributions in 'n_dimensions' dimensions 
     with means and stddevs given by the tensors 'loc' and 'scale' with shapes 
@@ -192,35 +402,27 @@ def MixMultiNormal1(n_components: int = 3,
 
     The resulting multivariate distribution has large (random) correlation.
 
-    Note: The functions 'MixMultiNormal1' and 'MixMultiNormal1_indep'
-    generate identical samples, different from the samples generated by
-    'MixMultiNormal2' and 'MixMultiNormal2_indep' (also identical).
+    Note: The functions 'MixMultiNormal1', 'MixMultiNormal1_indep',
+    'MixMultiNormal2' and 'MixMultiNormal2_indep' generate identical samples.
     
     Args:
         n_components: int, number of components
         n_dimensions: int, number of dimensions
         seed: int, random seed
+        dtype: str, dtype of the parameters ('float32' or 'float64')
+        validate: bool, if True TFP validates the distribution arguments (for debugging)
         
     Returns:
-        mix_gauss: tfp.distributions.Mixture, mixture of Gaussians
-    """
-    reset_random_seeds(seed)
-    loc: np.ndarray = np.random.sample([n_components, n_dimensions]) * 10
-    scale: np.ndarray = np.random.sample([n_components,n_dimensions])
-    probs: np.ndarray = np.random.sample(n_components)
-    components: List[tfp.distributions.MultivariateNormalDiag] = []
-    for i in range(n_components):
-        components.append(tfp.distributions.MultivariateNormalDiag(loc = loc[i],
-                                                     scale_diag = scale[i]))
-    mix_gauss: tfp.distributions.Mixture = tfp.distributions.Mixture(
-        cat = tfp.distributions.Categorical(probs = probs),
-        components = components,
-        validate_args = True)
+        mix_gauss: tfp.distributions.MixtureSameFamily, mixture of Gaussians
+    """
+    mix_gauss: tfp.distributions.MixtureSameFamily = MixMultiNormal2(n_components, n_dimensions, seed = seed, dtype = dtype, validate = validate)
     return mix_gauss
     
 def MixMultiNormal2(n_components: int = 3,
                     n_dimensions: int = 4,
-                    seed: int = 0) -> tfp.distributions.MixtureSameFamily:
+                    seed: int = 0,
+                    dtype: str = 'float32',
+                    validate: bool = False) -> tfp.distributions.MixtureSameFamily:
     """
     Defines a mixture of 'n_components' Multivariate Normal distributions in 'n_dimensions' dimensions 
     with means and stddevs given by the tensors 'loc' and 'scale' with shapes 
@@ -231,32 +433,35 @@ def MixMultiNormal2(n_components: int = 3,
 
     The resulting multivariate distribution has large (random) correlation.
 
-    Note: The functions 'MixMultiNormal1' and 'MixMultiNormal1_indep'
-    generate identical samples, different from the samples generated by
-    'MixMultiNormal2' and 'MixMultiNormal2_indep' (also identical).
+    Note: The functions 'MixMultiNormal1', 'MixMultiNormal1_indep',
+    'MixMultiNormal2' and 'MixMultiNormal2_indep' generate identical samples.
     
     Args:
         n_components: int, number of components
         n_dimensions: int, number of dimensions
         seed: int, random seed
+        dtype: str, dtype of the parameters ('float32' or 'float64')
+        validate: bool, if True TFP validates the distribution arguments (for debugging)
 
     Returns:
         mix_gauss: tfp.distributions.MixtureSameFamily, mixture of Gaussians
     """
-    reset_random_seeds(seed)
-    loc: np.ndarray = np.random.sample([n_components, n_dimensions]) * 10
-    scale: np.ndarray = np.random.sample([n_components,n_dimensions])
-    probs = np.random.sample(n_components)
+    loc: tf.Tensor
+    scale: tf.Tensor
+    logits: tf.Tensor
+    loc, scale, logits = _sample_params(n_components, n_dimensions, seed, dtype = dtype)
     mix_gauss: tfp.distributions.MixtureSameFamily = tfp.distributions.MixtureSameFamily(
-        mixture_distribution = tfp.distributions.Categorical(probs = probs),
+        mixture_distribution = tfp.distributions.Categorical(logits = logits),
         components_distribution = tfp.distributions.MultivariateNormalDiag(loc = loc,
                                                              scale_diag = scale),
-        validate_args=True)
+        validate_args = validate)
     return mix_gauss
 
 def MixMultiNormal1_indep(n_components: int = 3,
                           n_dimensions: int = 4,
-                          seed: int = 0) -> tfp.distributions.Independent:
+                          seed: int = 0,
+                          dtype: str = 'float32',
+                          validate: bool = False) -> tfp.distributions.Independent:
     """
     Defines a mixture of 'n_components' Multivariate Normal distributions in 'n_dimensions' dimensions 
     with means and stddevs given by the tensors 'loc' and 'scale' with shapes 
@@ -267,36 +472,27 @@ def MixMultiNormal1_indep(n_components: int = 3,
 
     The resulting multivariate distribution has large (random) correlation.
 
-    Note: The functions 'MixMultiNormal1' and 'MixMultiNormal1_indep'
-    generate identical samples, different from the samples generated by
-    'MixMultiNormal2' and 'MixMultiNormal2_indep' (also identical).
+    Note: The functions 'MixMultiNormal1', 'MixMultiNormal1_indep',
+    'MixMultiNormal2' and 'MixMultiNormal2_indep' generate identical samples.
     
     Args:
         n_components: int, number of components
         n_dimensions: int, number of dimensions
         seed: int, random seed
+        dtype: str, dtype of the parameters ('float32' or 'float64')
+        validate: bool, if True TFP validates the distribution arguments (for debugging)
 
     Returns:
         mix_gauss: tfp.distributions.Independent, mixture of Gaussians
     """
-    reset_random_seeds(seed)
-    loc: np.ndarray = np.random.sample([n_components, n_dimensions]) * 10
-    scale: np.ndarray = np.random.sample([n_components,n_dimensions])
-    probs: np.ndarray = np.random.sample(n_components)
-    components: List[tfp.distributions.MultivariateNormalDiag]
-    for i in range(n_components):
-        components.append(tfp.distributions.MultivariateNormalDiag(loc = loc[i],
-                                                     scale_diag = scale[i]))
-    mix_gauss: tfp.distributions.Independent = tfp.distributions.Independent(
-        distribution = tfp.distributions.Mixture(cat = tfp.distributions.Categorical(probs = probs),
-                                   components = components,
-                                   validate_args = True),
-        reinterpreted_batch_ndims = 0)
+    mix_gauss: tfp.distributions.Independent = MixMultiNormal2_indep(n_components, n_dimensions, seed = seed, dtype = dtype, validate = validate)
     return mix_gauss
     
 def MixMultiNormal2_indep(n_components: int = 3,
                           n_dimensions: int = 4,
-                          seed: int = 0) -> tfp.distributions.Independent:
+                          seed: int = 0,
+                          dtype: str = 'float32',
+                          validate: bool = False) -> tfp.distributions.Independent:
     """
     Defines a mixture of 'n_components' Multivariate Normal distributions in 'n_dimensions' dimensions 
     with means and stddevs given by the tensors 'loc' and 'scale' with shapes 
@@ -307,28 +503,29 @@ def MixMultiNormal2_indep(n_components: int = 3,
 
     The resulting multivariate distribution has large (random) correlation.
 
-    Note: The functions 'MixMultiNormal1' and 'MixMultiNormal1_indep'
-    generate identical samples, different from the samples generated by
-    'MixMultiNormal2' and 'MixMultiNormal2_indep' (also identical).
+    Note: The functions 'MixMultiNormal1', 'MixMultiNormal1_indep',
+    'MixMultiNormal2' and 'MixMultiNormal2_indep' generate identical samples.
     
     Args:
         n_components: int, number of components
         n_dimensions: int, number of dimensions
         seed: int, random seed
+        dtype: str, dtype of the parameters ('float32' or 'float64')
+        validate: bool, if True TFP validates the distribution arguments (for debugging)
 
     Returns:
         mix_gauss: tfp.distributions.Independent, mixture of Gaussians
     """
-    reset_random_seeds(seed)
-    loc: np.ndarray = np.random.sample([n_components, n_dimensions]) * 10
-    scale: np.ndarray = np.random.sample([n_components,n_dimensions])
-    probs: np.ndarray = np.random.sample(n_components)
+    loc: tf.Tensor
+    scale: tf.Tensor
+    logits: tf.Tensor
+    loc, scale, logits = _sample_params(n_components, n_dimensions, seed, dtype = dtype)
 
     mix_gauss: tfp.distributions.Independent = tfp.distributions.Independent(
-        distribution = tfp.distributions.MixtureSameFamily(mixture_distribution = tfp.distributions.Categorical(probs = probs),
+        distribution = tfp.distributions.MixtureSameFamily(mixture_distribution = tfp.distributions.Categorical(logits = logits),
                                              components_distribution = tfp.distributions.MultivariateNormalDiag(loc = loc,
                                                                                                   scale_diag = scale),
-                                             validate_args = True),
+                                             validate_args = validate),
         reinterpreted_batch_ndims = 0)
     return mix_gauss
 
@@ -347,6 +544,7 @@ def describe_distributions(distributions: List[tfp.distributions.Distribution])
 def rot_matrix(data: np.ndarray) -> np.ndarray:
     """
     Calculates the matrix that rotates the covariance matrix of 'data' to the diagonal basis.
+    The covariance matrix is computed in the floating point dtype of 'data' (float64 for integer data).
 
     Args:
         data: np.ndarray, data to rotate
@@ -354,53 +552,90 @@ def rot_matrix(data: np.ndarray) -> np.ndarray:
     Returns:
         rotation: np.ndarray, rotation matrix
     """
-    cov_matrix: np.ndarray = np.cov(data, rowvar=False)
+    data = np.asarray(data)
+    if not np.issubdtype(data.dtype, np.floating):
+        data = data.astype(np.float64)
+    X: np.ndarray = data - data.mean(axis=0, keepdims=True)
+    n: int = X.shape[0]
+    cov_matrix: np.ndarray = (X.T @ X) / (n - 1)
     w: np.ndarray
     V: np.ndarray
-    w, V = np.linalg.eig(cov_matrix)
+    w, V = np.linalg.eigh(cov_matrix)
     return V
 
+class RotationPair:
+    """
+    Rotation matrix 'R' stored together with a C-contiguous copy 'R_T' of its transpose.
+    Callers that invert the same rotation repeatedly can build the pair once and pass it
+    to both 'transform_data' and 'inverse_transform_data', paying for the transpose copy only once.
+    """
+    def __init__(self,
+                 rotation: np.ndarray) -> None:
+        self.R: np.ndarray = rotation
+        self.R_T: np.ndarray = np.ascontiguousarray(rotation.T)
+
 def transform_data(data: np.ndarray,
-                   rotation: np.ndarray) -> np.ndarray:
+                   rotation: Union[np.ndarray, RotationPair],
+                   out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Transforms the data according to the rotation matrix 'rotation'.
     
     Args:
         data: np.ndarray, data to transform
-        rotation: np.ndarray, rotation matrix
+        rotation: np.ndarray or RotationPair, rotation matrix (or rotation matrix with its cached transpose)
+        out: np.ndarray, optional pre-allocated output buffer with the same shape as 'data'
 
     Returns:
         data_new: np.ndarray, transformed data
     """
+    if isinstance(rotation, RotationPair):
+        rotation = rotation.R
     if len(rotation.shape) != 2:
         raise Exception('Rottion matrix must be a 2D matrix.')
     elif rotation.shape[0] != rotation.shape[1]:
         raise Exception('Rotation matrix must be square.')
-    data_new: np.ndarray = np.dot(data,rotation)
+    data = np.asarray(data)
+    if out is None:
+        out = np.empty(data.shape, dtype=np.result_type(data, rotation), order='C')
+    data_new: np.ndarray = np.matmul(data, rotation, out=out)
     return data_new
 
 def inverse_transform_data(data: np.ndarray,
-                           rotation: np.ndarray) -> np.ndarray:
+                           rotation: Union[np.ndarray, RotationPair],
+                           out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Transforms the data according to the inverse of the rotation matrix 'rotation'.
     
     Args:
         data: np.ndarray, data to transform
-        rotation: np.ndarray, rotation matrix
+        rotation: np.ndarray or RotationPair, rotation matrix (or rotation matrix with its cached transpose)
+        out: np.ndarray, optional pre-allocated output buffer with the same shape as 'data'
         
     Returns:
         data_new: np.ndarray, transformed data
     """
-    if len(rotation.shape) != 2:
+    rotation_T: np.ndarray
+    if isinstance(rotation, RotationPair):
+        rotation_T = rotation.R_T
+    else:
+        rotation_T = rotation.T
+    if len(rotation_T.shape) != 2:
         raise Exception('Rottion matrix must be a 2D matrix.')
-    elif rotation.shape[0] != rotation.shape[1]:
+    elif rotation_T.shape[0] != rotation_T.shape[1]:
         raise Exception('Rotation matrix must be square.')
-    data_new: np.ndarray = np.dot(data,np.transpose(rotation))
+    data = np.asarray(data)
+    if out is None:
+        out = np.empty(data.shape, dtype=np.result_type(data, rotation_T), order='C')
+    data_new: np.ndarray = np.matmul(data, rotation_T, out=out)
     return data_new
 
 def reset_random_seeds(seed: int = 0) -> None:
     """
     Resets the random seeds of the packages 'tensorflow', 'numpy' and 'random'.
+    The distribution factories in this module do not call it: their parameters are drawn
+    from a local 'np.random.Generator', so it is only an opt-in convenience (e.g. in notebooks)
+    to make the global random state reproducible. Setting 'PYTHONHASHSEED' at runtime only
+    affects subprocesses started afterwards.
     
     Args:
         seed: int, random seed
@@ -417,6 +652,12 @@ def RandCorr(matrixSize: int,
              seed: int) -> np.ndarray:
     """
     Generates a random correlation matrix of size 'matrixSize' x 'matrixSize'.
+    The matrix is the normalized Gram matrix 'A @ A.T' of a Gaussian 'matrixSize' x '2*matrixSize'
+    matrix 'A'. With twice as many columns as rows the spectrum of 'A @ A.T / (2*matrixSize)' stays
+    within about [(1-1/sqrt(2))^2, (1+1/sqrt(2))^2] ~ [0.09, 2.9] for any size, so the correlation
+    matrices remain well-conditioned (condition number of order 30), similarly to the previous
+    'sklearn.datasets.make_spd_matrix' construction. A square 'A' would instead give a condition
+    number growing like 4*matrixSize^2.
 
     Args:
         matrixSize: int, size of the matrix
@@ -425,12 +666,11 @@ def RandCorr(matrixSize: int,
     Returns:
         Vnorm: np.ndarray, normalized random correlation matrix
     """
-    np.random.seed(0)
-    V: np.ndarray = sklearn.datasets.make_spd_matrix(matrixSize,
-                                                     random_state = seed)
-    D: np.ndarray = np.sqrt(np.diag(np.diag(V)))
-    Dinv: np.ndarray = np.linalg.inv(D)
-    Vnorm: np.ndarray = np.matmul(np.matmul(Dinv,V),Dinv)
+    rng: np.random.Generator = np.random.default_rng(seed)
+    A: np.ndarray = rng.standard_normal((matrixSize, 2 * matrixSize))
+    V: np.ndarray = A @ A.T
+    d: np.ndarray = 1. / np.sqrt(np.diag(V))
+    Vnorm: np.ndarray = V * d[:, None] * d[None, :]
     return Vnorm
 
 def is_pos_def(x: np.ndarray) -> bool:
@@ -441,13 +681,19 @@ def is_pos_def(x: np.ndarray) -> bool:
         x: np.ndarray, matrix to check
 
     Returns:
-        bool, True if 'x' is positive definite, False otherwise
+        bool, True if 'x' is positive definite, False otherwise (including when 'x' contains infs or NaNs)
     """
     if len(x.shape) != 2:
         raise Exception('Input to is_pos_def must be a 2-dimensional array.')
     elif x.shape[0] != x.shape[1]:
         raise Exception('Input to is_pos_def must be a square matrix.')
-    return bool(np.all(np.linalg.eigvals(x) > 0))
+    if not np.all(np.isfinite(x)):
+        return False
+    try:
+        L: np.ndarray = np.linalg.cholesky((x + x.T) * 0.5)
+    except np.linalg.LinAlgError:
+        return False
+    return bool(np.all(np.isfinite(L)))
 
 def RandCov(std: np.ndarray,
             seed: int) -> np.ndarray:
@@ -461,10 +707,9 @@ def RandCov(std: np.ndarray,
     Returns:
         V: np.ndarray, random covariance matrix
     """
-    matrixSize: int = len(std)
-    corr: np.ndarray = RandCorr(matrixSize,seed)
-    D: np.ndarray = np.diag(std)
-    V: np.ndarray = np.matmul(np.matmul(D,corr),D)
+    std = np.asarray(std)
+    corr: np.ndarray = RandCorr(len(std), seed)
+    V: np.ndarray = corr * std[:, None] * std[None, :]
     return V
 
 def plot_corr_matrix(X: np.ndarray) -> None:
@@ -477,9 +722,10 @@ def plot_corr_matrix(X: np.ndarray) -> None:
     Returns:
         None (plots the correlation matrix)
     """
-    df: pd.DataFrame = pd.DataFrame(X)
+    from matplotlib import pyplot as plt # type: ignore
+    C: np.ndarray = np.corrcoef(X, rowvar=False)
     f: plt.Figure = plt.figure(figsize=(18, 18))
-    plt.matshow(df.corr(), fignum=f.number)
+    plt.matshow(C, fignum=f.number)
     cb = plt.colorbar()
     plt.grid(False)
     plt.show()